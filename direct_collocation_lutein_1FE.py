@@ -1,110 +1,125 @@
+import atexit
+import ctypes.util
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+
 import casadi as ca
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-def offline_profile():
-    # Degree of interpolating polynomial
-    d = 5
-
+import numpy.polynomial.polynomial as P
+
+def linear_solver_options():
+    # HSL solvers are much faster than MUMPS on small KKT systems but are only usable if IPOPT can load the HSL library,
+    # so the library that was found is passed to IPOPT explicitly (it only looks for libhsl by default)
+    for lib in ('hsl', 'coinhsl'):
+        hsllib = ctypes.util.find_library(lib)
+        if hsllib:
+            return {'linear_solver':'ma27', 'hsllib':hsllib}
+    return {'linear_solver':'mumps'}
+
+def jit_options():
+    # Compile the NLP functions to native code when a C compiler is available, otherwise evaluate them in the CasADi VM
+    # (compilation takes tens of seconds, so this only pays off when the solver is reused)
+    if shutil.which('gcc') is None:
+        return {}
+    return {'jit':True, 'compiler':'shell', 'jit_options':{'compiler':'gcc', 'flags':['-O3', '-march=native']}}
+
+def compile_function(fun):
+    # Generate C code for a numerical function, build it into a shared library with gcc and load it back as an external
+    if shutil.which('gcc') is None:
+        return fun
+    build_dir = tempfile.mkdtemp(prefix='lutein_')
+    try:
+        cg = ca.CodeGenerator(fun.name() + '.c')
+        cg.add(fun)
+        c_file = cg.generate(build_dir + os.sep)
+        so_file = os.path.join(build_dir, fun.name() + '.so')
+        subprocess.run(['gcc', '-O3', '-march=native', '-fPIC', '-shared', c_file, '-o', so_file], check=True)
+        return ca.external(fun.name(), so_file)
+    finally:
+        # The library stays mapped once loaded, so the generated files are not needed anymore
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+@functools.lru_cache(maxsize=None)
+def collocation_coefficients(d, scheme='radau'):
     # Get collocation points
-    tau_root = np.append(0, ca.collocation_points(d, 'radau'))
+    tau_root = np.append(0, ca.collocation_points(d, scheme))
 
-    # Coefficients of the collocation equation
-    C = np.zeros((d+1,d+1))
+    # Construct polynomial basis, column j holds the coefficients (lowest order first) of the Lagrange polynomial of point j
+    p = np.zeros((d+1,d+1))
+    for j in range(d+1):
+        roots = np.delete(tau_root, j)
+        p[:,j] = P.polyfromroots(roots) / np.prod(tau_root[j]-roots)
 
-    # Coefficients of the continuity equation
-    D = np.zeros(d+1)
+    # Coefficients of the continuity equation: all polynomials evaluated at the final time
+    D = P.polyval(1.0, p)
 
-    # Coefficients of the quadrature function
-    B = np.zeros(d+1)
+    # Coefficients of the collocation equation: time derivatives of all polynomials evaluated at all collocation points in one call
+    C = P.polyval(tau_root, P.polyder(p))
 
-    # Construct polynomial basis
-    for j in range(d+1):
-        # Construct Lagrange polynomials to get the polynomial basis at the collocation point
-        p = np.poly1d([1])
-        for r in range(d+1):
-            if r != j:
-                p *= np.poly1d([1, -tau_root[r]]) / (tau_root[j]-tau_root[r])
+    # Coefficients of the quadrature function: integrals of all polynomials evaluated at the final time
+    B = P.polyval(1.0, P.polyint(p))
 
-        # Evaluate the polynomial at the final time to get the coefficients of the continuity equation
-        D[j] = p(1.0)
+    # The cached arrays are shared by every caller, so they are made read-only
+    for arr in (C, D, B, tau_root):
+        arr.flags.writeable = False
 
-        # Evaluate the time derivative of the polynomial at all collocation points to get the coefficients of the continuity equation
-        pder = np.polyder(p)
-        for r in range(d+1):
-            C[j,r] = pder(tau_root[r])
+    return C, D, B, tau_root
 
-        # Evaluate the integral of the polynomial to get the coefficients of the quadrature function
-        pint = np.polyint(p)
-        B[j] = pint(1.0)
+@functools.lru_cache(maxsize=None)
+def build_solver(N=6, d=5, T=144., jit=False, warm_start=False):
+    # N: number of control intervals, d: degree of interpolating polynomial, T: time horizon
 
-    # Time horizon
-    T = 144.
+    # Coefficients of the collocation, continuity and quadrature equations (computed once per degree)
+    C, D, B, tau_root = collocation_coefficients(d, 'radau')
 
     ########################################
     # ----- Defining Dynamic System  ----- #
     ########################################
 
-    # Define vectors with names of states
-    states     = ['Cx','Cn', 'Cl']
-    nd         = len(states)
+    # Define states
+    nd         = 3
     xd         = ca.SX.sym('xd',nd)
-    for i in range(nd):
-        globals()[states[i]] = xd[i]
-
-    # Define vectors with names of algebraic variables
-    algebraics = []
-    na         = len(algebraics)
-    xa         = ca.SX.sym('xa',na)
-    for i in range(na):
-        globals()[algebraics[i]] = xa[i]
-
-    # Define vectors with names of control variables
-    inputs     = ['Fnin', 'I0']
-    nu         = len(inputs)
+    Cx, Cn, Cl = ca.vertsplit(xd)
+
+    # Define control variables
+    nu         = 2
     u          = ca.SX.sym("u",nu)
-    for i in range(nu):
-        globals()[inputs[i]] = u[i]
+    Fnin, I0   = ca.vertsplit(u)
 
-   
-    # Define model parameter names and values
-    modpar    = ['u_m', 'K_N', 'u_d', 'Y_nx', 'k_m', 'Kd', 'K_NL', 'Ks', 'Ki', 'Ksl', 'Kil', 'tau', 'Ka', 'L']
+    # Define model parameter values
     modparval = [0.152, 30, 5.95e-3, 305, 0.35, 3.71e-3, 10, 142.8, 214.2, 320.6, 480.9, 0.120*1000, 0.0,  0.084]
-
-    nmp         = len(modpar)
-    uncertainty = ca.SX.sym('uncp', nmp)
-    for i in range(nmp):
-        globals()[modpar[i]] = ca.SX(modparval[i])
+    u_m, K_N, u_d, Y_nx, k_m, Kd, K_NL, Ks, Ki, Ksl, Kil, tau, Ka, L = [ca.SX(v) for v in modparval]
 
     # algebraic equations
-    disc_int    = 11
-    Izlist      = []
+    n_quad      = 6                                                                  # number of Gauss-Legendre depth points
 
-    def lb_law(tau, X, Ka, z, L, I0):
-        Iz = I0 * (ca.exp(-(tau*X + Ka)*z) + ca.exp(-(tau*X + Ka)*(L-z)))
+    def lb_law(alpha, z, L, I0):
+        Iz = I0 * (ca.exp(-alpha*z) + ca.exp(-alpha*(L-z)))
         return Iz
 
-    Iz          = ca.SX.sym("Iz", disc_int)
-    for i in range(disc_int):
-        #print(i, i*L/(disc_int-1), L  )
-        Iz[i] = ca.SX(lb_law(tau, Cx, Ka, i*L/(disc_int-1), L, I0))
-
+    # The light profile is symmetric about L/2, so the depth average is taken over [0, L/2] with a Gauss-Legendre rule
+    # (nodes mapped from [-1, 1], weights normalised so that the weighted sum is the depth average)
+    nodes, weights = np.polynomial.legendre.leggauss(n_quad)
+    z           = L/2 * ca.DM((nodes + 1)/2)
+    w_quad      = ca.DM(weights/2)
 
-    um_trap = (Iz[0]/((Iz[0] + Ks + (Iz[0]**2)/Ki)) + Iz[-1]/((Iz[-1] + Ks + (Iz[-1]**2)/Ki)))  
-    km_trap = (Iz[0]/((Iz[0] + Ksl + (Iz[0]**2)/Kil)) + Iz[-1]/((Iz[-1] + Ksl + (Iz[-1]**2)/Kil))) 
+    # light intensity at all depth points at once
+    alpha       = tau*Cx + Ka                                                        # attenuation coefficient, shared by all depth points
+    Iz          = lb_law(alpha, z, L, I0)
 
-    for i in range(1,disc_int-1):
+    um_quad = ca.dot(w_quad, Iz/(Iz + Ks + Iz**2/Ki))
+    km_quad = ca.dot(w_quad, Iz/(Iz + Ksl + Iz**2/Kil))
 
-        um_trap     += 2*Iz[i]/(Iz[i] + Ks + (Iz[i]**2)/Ki)
-        km_trap     += 2*Iz[i]/(Iz[i] + Ksl + (Iz[i]**2)/Kil)
+    u_0 = u_m * um_quad
+    k_0 = k_m * km_quad
 
-    u_0 = u_m/20 * um_trap
-    k_0 = k_m/20 * km_trap
-        
     # variable rate equations - model construction 
-    dev_Cx  = u_0 * Cx * Cn/(Cn+K_N) - u_d*Cx
-    dev_Cn  = - Y_nx * u_0 * Cx * Cn/(Cn+K_N) + Fnin 
+    mu_N    = Cn/(Cn+K_N)                                                           # nitrate limitation, shared by biomass growth and nitrate uptake
+    dev_Cx  = u_0 * Cx * mu_N - u_d*Cx
+    dev_Cn  = - Y_nx * u_0 * Cx * mu_N + Fnin 
     dev_Cl  = k_0 * Cn/(Cn+K_NL) * Cx - Kd * Cl * Cx
 
     ODEeq =  ca.vertcat(dev_Cx, dev_Cn, dev_Cl)
@@ -120,106 +135,111 @@ def offline_profile():
     f = ca.Function('f', [xd, u], [ODEeq, g], ['x', 'u'], ['ODEeq', 'LT'])
 
     # Control discretization
-    N = 6                   # number of control intervals
     h = T/N                 # width of each finite element
 
+    # Dynamics evaluated over all collocation points of a finite element in one call
+    f_coll = f.map(d)
+
+    # Collocation equations of one finite element, built once and called for every interval
+    Xk_el   = ca.SX.sym('Xk', nd)                                                   # state at the start of the element
+    Xc_el   = ca.SX.sym('Xc', nd, d)                                                # states at the collocation points (one column per point)
+    Uk_el   = ca.SX.sym('Uk', nu)                                                   # control over the element
+    X_el    = ca.horzcat(Xk_el, Xc_el)
+    fc, qc  = f_coll(Xc_el, ca.repmat(Uk_el, 1, d))                                 # true time derivative and operational constraints at the collocation points
+    xp      = ca.mtimes(X_el, C[:,1:])                                              # time derivative of state via polynomial basis i.e. collocation equations
+    # collocation equation and operational constraint of each collocation point, stacked point by point
+    g_el    = ca.vec(ca.vertcat(h*fc - xp, qc))
+    Xend_el = ca.mtimes(X_el, D)                                                    # state at the end of the element, for subsequent continuity constraint (Lagrange)
+    F = ca.Function('F', [Xk_el, Xc_el, Uk_el], [g_el, Xend_el], ['x0', 'xc', 'u'], ['g', 'xf'])
+    lbg_el  = np.tile([0, 0, 0, -np.inf, -np.inf, -np.inf], d)                      # LB=UB on collocation equations, upper bound only on operational constraints
+
     # Generating initial guesses
     #init_sobol = sobol_seq.i4_sobol_generate(nu + nd,N) # shape (steps_, 2)
     #ctrl_sobol = (lb + (ub-lb)*init_sobol[:,:]).T
 
-    # Start with an empty NLP
+    # Start with an empty NLP (bounds and initial guess preallocated, filled using running offsets)
+    n_w = nd + N*(nu + d*nd + nd)                                                   # number of decision variables
+    n_g = nd + N*(nd + 2*d*nd + nd)                                                 # number of constraints
     w=[]
-    w0 = []
-    lbw = []
-    ubw = []
+    w0 = np.empty(n_w)
+    lbw = np.empty(n_w)
+    ubw = np.empty(n_w)
+    off_w = 0
     J = 0
     g=[]
-    lbg = []
-    ubg = []
+    lbg = np.empty(n_g)
+    ubg = np.empty(n_g)
+    off_g = 0
 
     # For plotting x and u given w
     x_plot = []
     u_plot = []
 
     # "Lift" initial conditions
-    Xk = ca.MX.sym('X0', nd)                                                        # initialising state symbolically
+    Xk = ca.SX.sym('X0', nd)                                                        # initialising state symbolically
     w.append(Xk)                                                                    # appending initial state to sequence
-    lbw.append([0.27, 765., 0.0])                                                   # setting lower bound of initial state 
-    ubw.append([0.27, 765., 0.0])                                                   # setting upper bound of initial state  (note that upper and lower bound are the same enforcing the constraint)
-    w0.append([0.27, 765., 0.0])                                                    # setting initial guess for state
+    lbw[off_w:off_w+nd] = [0.27, 765., 0.0]                                         # setting lower bound of initial state 
+    ubw[off_w:off_w+nd] = [0.27, 765., 0.0]                                         # setting upper bound of initial state  (note that upper and lower bound are the same enforcing the constraint)
+    w0[off_w:off_w+nd]  = [0.27, 765., 0.0]                                         # setting initial guess for state
+    off_w += nd
     x_plot.append(Xk)                                                               # appending symbolic variable to the plotting list
     Uk_prev = [0.001, 100] 
 
     # Formulate the NLP
     for k in range(N):
         # New NLP variable for the control
-        Uk = ca.MX.sym('U_' + str(k), nu)                                           # defining symbolic variable u_k
+        Uk = ca.SX.sym('U_' + str(k), nu)                                           # defining symbolic variable u_k
         w.append(Uk)                                                                # appending to sequence to be optimised
-        lbw.append([0.1, 100])                                                      # setting lower bounds for control 
-        ubw.append([100., 1000])                                                    # setting upper bounds for the control 
-        w0.append([30, 1000])                                                       # providing an initial guess for the control 
+        lbw[off_w:off_w+nu] = [0.1, 100]                                            # setting lower bounds for control 
+        ubw[off_w:off_w+nu] = [100., 1000]                                          # setting upper bounds for the control 
+        w0[off_w:off_w+nu]  = [30, 1000]                                            # providing an initial guess for the control 
+        off_w += nu
         u_plot.append(Uk)                                                           # appending symbolic variable for plotting 
 
         # add operational constraint 
         _, qk = f(Xk,Uk)                                                            # enforcing operational constraint
         g.append(qk)
-        lbg.append([-np.inf, -np.inf, -np.inf])                                     # enforcing lower bounds 
-        ubg.append([0, 0, 0])                                                       # enforcing upper bounds
+        lbg[off_g:off_g+nd] = -np.inf                                               # enforcing lower bounds 
+        ubg[off_g:off_g+nd] = 0                                                     # enforcing upper bounds
+        off_g += nd
 
         # State at collocation points
-        Xc = []                                                                     # initialising list 
-        for j in range(d):
-            Xkj = ca.MX.sym('X_'+str(k)+'_'+str(j), nd)                             # defining a symbolic variable for the collocation point 
-            Xc.append(Xkj)                                                          # appending state collocation variable to list for path constraint (next code block)
-            w.append(Xkj)                                                           # appending state collocation variable to sequence to be optimised 
-            lbw.append([0., 0., 0.])                                                # setting lower bound on the state collocation variable  
-            ubw.append([100, 1e5, 100])                                             # setting upper bound on the state collocation variable
-            w0.append([1.2, 800, 2])                                                # initialising a guess for the collocation variable 
-        
-        #g.append()
-
-        # Loop over collocation points
-        Xk_end = D[0]*Xk                                                            # declaring final state of element for continuity                                
-        for j in range(1,d+1):
-            # Expression for the state derivative at the collocation point           
-            xp = C[0,j]*Xk                                                                                                      
-            for r in range(d): xp = xp + C[r+1,j]*Xc[r]                              # representing time derivative of state via polynomial basis i.e. collocation equations
-
-            # Append collocation equations
-            fj, qj = f(Xc[j-1],Uk)                                                   # formulating expression of true time derivative with state and control as input and derivative and objective as return 
-            g.append(h*fj - xp)                                                      # formulating constraint on collocation equations 
-            lbg.append([0, 0, 0])                                                    # enforcing constraint via LB=UB
-            ubg.append([0, 0, 0])                                                    # enforcing constraint via LB=UB
-            # append operational constraints        
-            g.append(qj)                                                            # appending constraint from function 
-            lbg.append([-np.inf, -np.inf, -np.inf])                                 # enforcing lower bounds 
-            ubg.append([0, 0, 0])                                                   # enforcing upper bounds
-
-            # Add contribution to the end state
-            Xk_end = Xk_end + D[j]*Xc[j-1];                                          # calculating state for end of finite element, for subsequent continuity constraint (Lagrange)
-
-            # Add contribution to quadrature function (not required for my objective function)
-            #J = J + B[j]*qj*h                                                       # calculating state for end of finite element, for subsequent continuity constraint (RK)                                          # forecasting contribution of state trajectory to objective function across a finite element using RK 
+        Xc = ca.SX.sym('X_'+str(k)+'_c', nd, d)                                     # defining a symbolic variable for all collocation points of the element
+        w.append(ca.vec(Xc))                                                        # appending state collocation variables to sequence to be optimised
+        lbw[off_w:off_w+d*nd] = np.tile([0., 0., 0.], d)                            # setting lower bound on the state collocation variables
+        ubw[off_w:off_w+d*nd] = np.tile([100, 1e5, 100], d)                         # setting upper bound on the state collocation variables
+        w0[off_w:off_w+d*nd]  = np.tile([1.2, 800, 2], d)                           # initialising a guess for the collocation variables
+        off_w += d*nd
+
+        # Collocation equations and operational constraints at the collocation points
+        g_k, Xk_end = F(Xk, Xc, Uk)
+        g.append(g_k)
+        lbg[off_g:off_g+2*d*nd] = lbg_el
+        ubg[off_g:off_g+2*d*nd] = 0
+        off_g += 2*d*nd
 
         # New NLP variable for state at end of interval
-        Xk = ca.MX.sym('X_' + str(k+1), nd)                                         # defining new symbolic state 
+        Xk = ca.SX.sym('X_' + str(k+1), nd)                                         # defining new symbolic state 
         w.append(Xk)                                                                # appending state to optimisation sequence
-        lbw.append([0., 0., 0.])                                                    # appending lower bounds
-        ubw.append([100, 1e5, 100])                                                 # appending upper bounds
-        w0.append([1.2, 800, 2])                                                    # appending initialisation of variable
+        lbw[off_w:off_w+nd] = [0., 0., 0.]                                          # setting lower bounds
+        ubw[off_w:off_w+nd] = [100, 1e5, 100]                                       # setting upper bounds
+        w0[off_w:off_w+nd]  = [1.2, 800, 2]                                         # setting initialisation of variable
+        off_w += nd
         x_plot.append(Xk)                                                           # appending state to plot sequence
 
         # Add equality constraint
         g.append(Xk_end-Xk)                                                         # enforcing path continuity constraint 
-        lbg.append([0, 0, 0])                                                       # enforcing constraint via LB=UB 
-        ubg.append([0, 0, 0])                                                       # enforcing constraint via LB=UB
+        lbg[off_g:off_g+nd] = 0                                                     # enforcing constraint via LB=UB 
+        ubg[off_g:off_g+nd] = 0                                                     # enforcing constraint via LB=UB
+        off_g += nd
 
         if k == N-1:
             # add operational constraint 
             _, qk = f(Xk,Uk)                                                            # enforcing operational constraint
             g.append(qk)
-            lbg.append([-np.inf, -np.inf, -np.inf])                                     # enforcing lower bounds 
-            ubg.append([0, 0, 0])                                                       # enforcing upper bounds
+            lbg[off_g:off_g+nd] = -np.inf                                               # enforcing lower bounds 
+            ubg[off_g:off_g+nd] = 0                                                     # enforcing upper bounds
+            off_g += nd
 
 
         # Objective function (written as in the RL context, hence we minimise J in the problem)
@@ -233,44 +253,78 @@ def offline_profile():
         Uk_prev = Uk
 
     # Concatenate vectors
+    assert off_w == n_w and off_g == n_g
     w = ca.vertcat(*w)
     g = ca.vertcat(*g)
     x_plot = ca.horzcat(*x_plot)
     u_plot = ca.horzcat(*u_plot)
-    w0 = np.concatenate(w0)
-    lbw = np.concatenate(lbw)
-    ubw = np.concatenate(ubw)
-    lbg = np.concatenate(lbg)
-    ubg = np.concatenate(ubg)
 
     # Create an NLP solver
     prob = {'f': -J, 'x': w, 'g': g}
-    solver = ca.nlpsol('solver', 'ipopt', prob, {'ipopt':{'max_iter':10e3}});
-    
+    ipopt_opts = {'max_iter':10000, 'mu_strategy':'adaptive', **linear_solver_options(), 'print_level':0, 'sb':'yes',
+                  'hessian_approximation':'exact', 'tol':1e-6}
+    if warm_start:
+        # Start from the given primal-dual point instead of pushing it into the interior of the bounds
+        ipopt_opts.update({'warm_start_init_point':'yes', 'warm_start_bound_push':1e-9, 'warm_start_mult_bound_push':1e-9})
+    # Path constraints acting on a single state are moved from g into the variable bounds
+    solver = ca.nlpsol('solver', 'ipopt', prob, {'expand':True, 'print_time':False, 'detect_simple_bounds':True,
+                                                 **(jit_options() if jit else {}), 'ipopt':ipopt_opts})
 
     # Function to get x and u trajectories from w
     trajectories = ca.Function('trajectories', [w], [x_plot, u_plot], ['w'], ['x', 'u'])
+    if jit:
+        trajectories = compile_function(trajectories)
+
+    # The returned arrays are shared by every caller of the cache, so they are made read-only (copy before modifying)
+    for arr in (w0, lbw, ubw, lbg, ubg):
+        arr.flags.writeable = False
+
+    return solver, trajectories, w0, lbw, ubw, lbg, ubg
+
+# CasADi only removes the JIT sources and libraries it wrote to the working directory when the solver is destroyed,
+# so the cached solvers are released before the interpreter exits
+atexit.register(build_solver.cache_clear)
 
-    # Solve the NLP
-    sol = solver(x0=w0, lbx=lbw, ubx=ubw, lbg=lbg, ubg=ubg)
+def run_solver(solver, trajectories, w0, lbw, ubw, lbg, ubg, lam_x0=0, lam_g0=0):
+    # Solve the NLP (primal guess w0 and multipliers lam_x0, lam_g0 are used as the IPOPT warm start point)
+    sol = solver(x0=w0, lam_x0=lam_x0, lam_g0=lam_g0, lbx=lbw, ubx=ubw, lbg=lbg, ubg=ubg)
     x_opt, u_opt = trajectories(sol['x'])
     x_opt = x_opt.full() # to numpy array
     u_opt = u_opt.full() # to numpy array
 
-    g1 = x_opt [0] * -1.67 + x_opt[2]
-    g2 = -x_opt[1] + 150
-    g3 = x_opt[0] -2.6
-    #print(g1, g2, g3)
+    return x_opt, u_opt, sol
+
+# Last successful primal-dual solution for each jit setting, used to warm start the next solve
+_last_solution = {}
+
+def solve_ocp(x_init=None, jit=False, warm_start=True):
+    # Symbolic problem and solver are only constructed on the first call
+    solver, trajectories, w0, lbw, ubw, lbg, ubg = build_solver(jit=jit, warm_start=warm_start)
+
+    # Fix the initial state (e.g. the measured state in a receding-horizon loop) on copies of the cached bounds
+    lbw, ubw = lbw.copy(), ubw.copy()
+    if x_init is not None:
+        nd = trajectories.size1_out(0)                                              # number of states (rows of the state trajectory)
+        lbw[:nd] = ubw[:nd] = x_init
 
-    print('success', solver.stats()['success'])
-    # action color map 
-    Ecmap = sns.color_palette("Greens", n_colors=1, as_cmap = True)
-    Acmap = sns.color_palette("rocket", n_colors=1, as_cmap = True)
+    prev = _last_solution.get(jit) if warm_start else None
+    if prev is None:
+        x_opt, u_opt, sol = run_solver(solver, trajectories, w0, lbw, ubw, lbg, ubg)
+    else:
+        x_opt, u_opt, sol = run_solver(solver, trajectories, prev['x'], lbw, ubw, lbg, ubg, prev['lam_x'], prev['lam_g'])
+    if solver.stats()['success']:
+        _last_solution[jit] = sol
 
-    # state color map
-    Acmap1 = sns.color_palette("Blues", n_colors=1, as_cmap = True)
-    Ecmap1 = sns.color_palette("Set1_r", n_colors=1, as_cmap = True)
-    Stepmap = sns.color_palette("Purples_r", n_colors=1, as_cmap = True)
+    return x_opt, u_opt, solver.stats()
+
+_PLOT_STYLE_INITIALIZED = False
+
+def _configure_plot_style():
+    # Font and axes settings only need to be applied once per process
+    global _PLOT_STYLE_INITIALIZED
+    if _PLOT_STYLE_INITIALIZED:
+        return
+    import matplotlib.pyplot as plt
 
     font = {'family' : 'serif',
     'weight' : 'bold','size'   : 40}
@@ -279,11 +333,18 @@ def offline_profile():
     plt.rc('axes', titlesize=35)        # fontsize of the axes title
     plt.rc('axes', labelsize=40)        # fontsize of the x and y label 
     plt.rc('axes', linewidth=2)
+    _PLOT_STYLE_INITIALIZED = True
+
+def plot_result(x_opt, u_opt, path=None):
+    # Plotting library is only imported when a figure is requested
+    import matplotlib.pyplot as plt
+
+    _configure_plot_style()
+    N = u_opt.shape[1]
 
     # Plot the result
     ep_length   = 7
     tgrid = np.linspace(0, N, N+1)
-    colors = np.linspace(0,1,1)
     fig     = plt.figure(figsize = (60,30))
     ax = plt.subplot(3,2,1)
     plt.plot(tgrid, x_opt[0], linewidth= 2, label ='X' )
@@ -359,10 +420,25 @@ def offline_profile():
     #plt.grid()
     plt.subplots_adjust(hspace = .25)
     plt.subplots_adjust(wspace = .25)
-    plt.savefig('C:\\Users\\g41606mm\\Dropbox\\Projects\\Python\\MPC\\CCPOProject\\LuteinCS\\Validation\\MPCopenloop_optim3.png')
+    if path is None:
+        plt.show()
+    else:
+        plt.savefig(path)
     plt.close()
 
-    print(type(u_opt[:,0]))
+def offline_profile(x_init=None, plot=False, path=None, jit=False, warm_start=True):
+    x_opt, u_opt, stats = solve_ocp(x_init, jit=jit, warm_start=warm_start)
+
+    g1 = x_opt [0] * -1.67 + x_opt[2]
+    g2 = -x_opt[1] + 150
+    g3 = x_opt[0] -2.6
+    #print(g1, g2, g3)
+
+    print('success', stats['success'])
+    if plot:
+        plot_result(x_opt, u_opt, path)
+
     return u_opt
 
-offline_profile()
\ No newline at end of file
+if __name__ == '__main__':
+    offline_profile(plot=True, path='MPCopenloop_optim3.png')
\ No newline at end of file